@@ -15,22 +15,61 @@ Características:
 """
 
 import os
+import asyncio
+import base64
+import secrets
 import re
 import json
-import csv
+import hmac
+import hashlib
+import struct
 import requests
 import time
+import queue
 import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import compress
+from operator import itemgetter, ne
 from typing import Dict, Any, List, Optional, Set, Tuple
-from collections import defaultdict
+from dataclasses import asdict, dataclass
 from datetime import datetime
+from types import MappingProxyType
+from urllib.parse import quote
+from uuid import uuid4
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from urllib3.util.retry import Retry
+
+try:
+    import orjson  # Parser/serializador JSON acelerado (opcional)
+except ImportError:
+    orjson = None
+
+try:
+    import httpx  # Cliente HTTP asíncrono para el monitor por consulta (opcional)
+except ImportError:
+    httpx = None
+
+try:
+    import websocket  # websocket-client, para recibir cambios por push (opcional)
+except ImportError:
+    websocket = None
+
+try:
+    # Cifrado de comandos del WebSocket (RSA + AES), necesario para pedir el token
+    from cryptography.hazmat.primitives.asymmetric.padding import PKCS1v15
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    from cryptography.hazmat.primitives.serialization import load_der_public_key
+except ImportError:
+    Cipher = None
 
 # Configuración desde variables de entorno
 LOXONE_IP = os.getenv("LOXONE_IP", "192.168.1.50")
 LOXONE_PORT = os.getenv("LOXONE_PORT", "8050")
 LOXONE_USER = os.getenv("LOXONE_USER", "admin")
 LOXONE_PASSWORD = os.getenv("LOXONE_PASSWORD", "admin")
+# Forzar el monitor HTTP clásico con threads aunque httpx esté instalado
+LOXONE_LEGACY_MONITOR = os.getenv("LOXONE_LEGACY_MONITOR", "").lower() in ("1", "true", "yes")
 
 # Construir URL base con puerto
 if LOXONE_PORT and LOXONE_PORT != "80":
@@ -38,6 +77,187 @@ if LOXONE_PORT and LOXONE_PORT != "80":
 else:
     LOXONE_BASE_URL = f"http://{LOXONE_IP}"
 
+LOXONE_WS_URL = LOXONE_BASE_URL.replace("http://", "ws://", 1) + "/ws/rfc6455"
+
+# Protocolo binario del WebSocket de Loxone:
+# cabecera de 8 bytes (0x03, identificador, flags, reservado, longitud uint32)
+_WS_HEADER = struct.Struct('<BBBxI')
+# Evento de estado de valor: UUID binario (16 bytes) + double (8 bytes)
+_WS_VALUE_EVENT_SIZE = 24
+_WS_DOUBLE = struct.Struct('<d')
+_WS_MSG_TEXT = 0
+_WS_MSG_VALUE_STATES = 2
+_WS_MSG_OUT_OF_SERVICE = 5
+_WS_MSG_KEEPALIVE = 6
+_WS_KEEPALIVE_INTERVAL = 60
+
+# Mapeo de tipos de Loxone a nombres legibles
+_TYPE_MAPPING = MappingProxyType({
+    # Luces y salidas
+    'Switch': 'Interruptor',
+    'Pushbutton': 'Pulsador',
+    'Dimmer': 'Regulador de luz',
+    'LightController': 'Controlador de luz',
+    'ColorPicker': 'Selector de color RGB',
+    'LightControllerV2': 'Controlador de luz V2',
+
+    # Persianas y sombreado
+    'Jalousie': 'Persiana/Estor',
+    'Gate': 'Puerta motorizada',
+    'Window': 'Ventana motorizada',
+    'Blind': 'Cortina',
+
+    # Clima
+    'IRoomController': 'Control climático',
+    'IRoomControllerV2': 'Control climático V2',
+    'Heatmixer': 'Mezclador de calefacción',
+
+    # Multimedia
+    'AudioZone': 'Zona de audio',
+    'MediaClient': 'Cliente multimedia',
+    'MediaServer': 'Servidor multimedia',
+
+    # Alarmas y seguridad
+    'Alarm': 'Alarma',
+    'AlarmClock': 'Despertador',
+    'Tracker': 'Rastreador',
+    'Presence': 'Detector de presencia',
+
+    # Medidores
+    'Meter': 'Medidor',
+    'EnergyMonitor': 'Monitor de energía',
+
+    # Comunicación
+    'InfoOnlyDigital': 'Estado digital',
+    'InfoOnlyAnalog': 'Estado analógico',
+    'InfoOnlyText': 'Información texto',
+
+    # Automatización
+    'TimedSwitch': 'Temporizador',
+    'UpDownDigital': 'Contador digital',
+    'Webpage': 'Página web',
+    'MessageCenter': 'Centro de mensajes',
+
+    # Otros
+    'Intercom': 'Intercomunicador',
+    'CentralVentilation': 'Ventilación centralizada',
+    'SmokeAlarm': 'Detector de humo',
+    'Sauna': 'Sauna',
+    'Pool': 'Piscina',
+})
+
+# Valores por defecto cuando un control no tiene habitación o categoría
+NO_ROOM = 'Sin habitación'
+NO_CATEGORY = 'Sin categoría'
+
+# Cabecera del CSV del monitor (mismo formato que csv.writer: separador ',' y fin '\r\n')
+_CSV_HEADER = b'timestamp,uuid,name,type,room,state\r\n'
+_CSV_SPECIAL_CHARS = re.compile(r'[",\r\n]')
+
+# Valor de LL.value en la respuesta de estado: cadena sin escapes o número decimal simple
+# (true/false, exponentes, etc. se resuelven con el parseo JSON completo)
+_STATE_VALUE_RE = re.compile(rb'"value"\s*:\s*(?:"([^"\\]*)"|(-?\d+(?:\.\d+)?)\s*[,}])')
+
+# Caché de estados frecuentes ("0", "1", "22.5"...) para compartir una sola instancia por valor;
+# acotada porque los valores analógicos pueden no repetirse nunca
+_STATE_CACHE: Dict[str, str] = {}
+_STATE_CACHE_MAX = 1024
+
+# Subárboles de LoxAPP3.json que se conservan tras el parseo
+_STRUCTURE_KEYS = ('msInfo', 'controls', 'rooms', 'cats')
+
+# Estados preferidos para representar el valor principal de un control
+_PRIMARY_STATE_KEYS = ('value', 'active', 'position', 'tempActual', 'actual')
+
+
+def encrypt_ws_command(command: str, aes_key: bytes, aes_iv: bytes) -> str:
+    """Cifra un comando para enviarlo como jdev/sys/enc/<cifrado> (AES-256-CBC, relleno con ceros)"""
+    plaintext = f"salt/{secrets.token_hex(2)}/{command}\0".encode('utf-8')
+    plaintext += b'\0' * (-len(plaintext) % 16)
+    encryptor = Cipher(algorithms.AES(aes_key), modes.CBC(aes_iv)).encryptor()
+    cipher_text = encryptor.update(plaintext) + encryptor.finalize()
+    return "jdev/sys/enc/" + quote(base64.b64encode(cipher_text).decode('ascii'), safe='')
+
+
+def pack_loxone_uuid(uuid: str) -> bytes:
+    """Convierte un UUID de Loxone (xxxxxxxx-xxxx-xxxx-xxxxxxxxxxxxxxxx) a su forma binaria"""
+    data1, data2, data3, data4 = uuid.split('-')
+    return struct.pack('<IHH8s', int(data1, 16), int(data2, 16), int(data3, 16), bytes.fromhex(data4))
+
+
+class _OrjsonResponse(requests.Response):
+    """Response cuyo json() usa orjson, que parsea los bytes sin decodificar a str"""
+
+    def json(self, **kwargs):
+        return orjson.loads(self.content)
+
+
+def _orjson_response_hook(response, *args, **kwargs):
+    """Convierte la respuesta en _OrjsonResponse"""
+    # Cambiar la clase (en lugar de guardar un closure sobre la propia respuesta)
+    # evita un ciclo de referencias: el cuerpo se libera en cuanto se suelta la respuesta
+    response.__class__ = _OrjsonResponse
+    return response
+
+
+def csv_field(value: str) -> str:
+    """Escapa un campo CSV igual que csv.writer (QUOTE_MINIMAL)"""
+    if _CSV_SPECIAL_CHARS.search(value):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def canonical_state(value: str) -> str:
+    """Devuelve la instancia compartida de un estado (las comparaciones se resuelven por identidad)"""
+    cached = _STATE_CACHE.get(value)
+    if cached is not None:
+        return cached
+    if len(_STATE_CACHE) < _STATE_CACHE_MAX:
+        _STATE_CACHE[value] = value
+    return value
+
+
+def format_state_value(value: float) -> str:
+    """Formatea un valor recibido por WebSocket igual que la API HTTP"""
+    return canonical_state(str(int(value)) if value.is_integer() else repr(value))
+
+
+@dataclass
+class ClassifiedControl:
+    """Control de Loxone clasificado (con __slots__: sin dict por instancia)"""
+    __slots__ = (
+        'uuid', 'name', 'type', 'type_readable', 'room', 'category', 'states', 'details', 'pollable', 'index'
+    )
+
+    uuid: str
+    name: str
+    type: str
+    type_readable: str
+    room: Optional[str]
+    category: Optional[str]
+    states: Dict[str, Any]
+    details: Dict[str, Any]
+    pollable: bool  # False si el control no expone estados (Webpage, MessageCenter...)
+    index: int
+
+    @classmethod
+    def from_loxone(cls, uuid: str, control: Dict[str, Any], type_readable: str,
+                    room: Optional[str], category: Optional[str]) -> "ClassifiedControl":
+        """Construye el control clasificado a partir de su entrada en LoxAPP3.json"""
+        states = control.get('states', {})
+        return cls(
+            uuid=uuid,
+            name=control.get('name', uuid),
+            type=control.get('type', 'unknown'),
+            type_readable=type_readable,
+            room=room,
+            category=category,
+            states=states,
+            details=control.get('details', {}),
+            pollable=bool(states),
+            index=0
+        )
+
 
 class LoxoneAnalyzer:
     """Analizador inteligente de controles de Loxone Miniserver"""
@@ -50,6 +270,22 @@ class LoxoneAnalyzer:
         self.analysis: Dict[str, Any] = {}
         self.auth = HTTPBasicAuth(LOXONE_USER, LOXONE_PASSWORD)
 
+        # Sesión HTTP persistente: reutiliza la conexión keep-alive con el
+        # Miniserver en lugar de abrir un socket nuevo en cada petición
+        self.session = requests.Session()
+        self.session.auth = self.auth
+        self.session.headers["Connection"] = "keep-alive"
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=32,
+            max_retries=Retry(total=2, backoff_factor=0.2)
+        )
+        self.session.mount("http://", adapter)
+
+        # response.json() pasa a usar orjson en todas las respuestas de la sesión
+        if orjson is not None:
+            self.session.hooks['response'].append(_orjson_response_hook)
+
         print(f"🔧 Configuración:")
         print(f"   URL: {LOXONE_BASE_URL}")
         print(f"   Usuario: {LOXONE_USER}")
@@ -61,9 +297,13 @@ class LoxoneAnalyzer:
             url = f"{LOXONE_BASE_URL}/data/LoxAPP3.json"
 
             print(f"   Intentando: {url}")
-            response = requests.get(url, auth=self.auth, timeout=30)
+            response = self.session.get(url, timeout=30)
             response.raise_for_status()
 
+            content_encoding = response.headers.get('Content-Encoding')
+            if content_encoding:
+                print(f"   ℹ️  Transferencia comprimida ({content_encoding})")
+
             data = response.json()
 
             # Detectar formato de respuesta
@@ -73,16 +313,21 @@ class LoxoneAnalyzer:
             if 'LL' in data:
                 # Formato con wrapper LL (versiones antiguas)
                 print("   ℹ️  Formato detectado: Con wrapper LL")
-                self.structure = data['LL']
+                structure = data['LL']
             elif 'controls' in data:
                 # Formato directo (versiones modernas)
                 print("   ℹ️  Formato detectado: Directo (sin wrapper LL)")
-                self.structure = data
+                structure = data
             else:
                 print("❌ Error: Formato de respuesta inesperado")
                 print(f"   Claves encontradas: {list(data.keys())}")
                 return False
 
+            # Conservar solo los subárboles necesarios y liberar la respuesta
+            # completa (bytes originales + resto del árbol) cuanto antes
+            self.structure = {key: structure[key] for key in _STRUCTURE_KEYS if key in structure}
+            del data, structure, response
+
             self.controls = self.structure.get('controls', {})
             self.rooms = self.structure.get('rooms', {})
             self.categories = self.structure.get('cats', {})
@@ -130,91 +375,26 @@ class LoxoneAnalyzer:
         """Obtiene el nombre de una habitación por su UUID"""
         if not room_uuid or room_uuid not in self.rooms:
             return None
-        return self.rooms[room_uuid].get('name', 'Sin habitación')
+        return self.rooms[room_uuid].get('name', NO_ROOM)
 
     def get_category_name(self, cat_uuid: str) -> Optional[str]:
         """Obtiene el nombre de una categoría por su UUID"""
         if not cat_uuid or cat_uuid not in self.categories:
             return None
-        return self.categories[cat_uuid].get('name', 'Sin categoría')
+        return self.categories[cat_uuid].get('name', NO_CATEGORY)
 
-    def classify_control(self, uuid: str, control: Dict[str, Any]) -> Dict[str, Any]:
+    def classify_control(self, uuid: str, control: Dict[str, Any]) -> ClassifiedControl:
         """Clasifica un control según su tipo"""
 
         control_type = control.get('type', 'unknown')
-        name = control.get('name', uuid)
-        room_uuid = control.get('room', '')
-        cat_uuid = control.get('cat', '')
-
-        # Mapeo de tipos de Loxone a nombres legibles
-        type_mapping = {
-            # Luces y salidas
-            'Switch': 'Interruptor',
-            'Pushbutton': 'Pulsador',
-            'Dimmer': 'Regulador de luz',
-            'LightController': 'Controlador de luz',
-            'ColorPicker': 'Selector de color RGB',
-            'LightControllerV2': 'Controlador de luz V2',
-
-            # Persianas y sombreado
-            'Jalousie': 'Persiana/Estor',
-            'Gate': 'Puerta motorizada',
-            'Window': 'Ventana motorizada',
-            'Blind': 'Cortina',
-
-            # Clima
-            'IRoomController': 'Control climático',
-            'IRoomControllerV2': 'Control climático V2',
-            'Heatmixer': 'Mezclador de calefacción',
-
-            # Multimedia
-            'AudioZone': 'Zona de audio',
-            'MediaClient': 'Cliente multimedia',
-            'MediaServer': 'Servidor multimedia',
-
-            # Alarmas y seguridad
-            'Alarm': 'Alarma',
-            'AlarmClock': 'Despertador',
-            'Tracker': 'Rastreador',
-            'Presence': 'Detector de presencia',
-
-            # Medidores
-            'Meter': 'Medidor',
-            'EnergyMonitor': 'Monitor de energía',
-
-            # Comunicación
-            'InfoOnlyDigital': 'Estado digital',
-            'InfoOnlyAnalog': 'Estado analógico',
-            'InfoOnlyText': 'Información texto',
-
-            # Automatización
-            'TimedSwitch': 'Temporizador',
-            'UpDownDigital': 'Contador digital',
-            'Webpage': 'Página web',
-            'MessageCenter': 'Centro de mensajes',
-
-            # Otros
-            'Intercom': 'Intercomunicador',
-            'CentralVentilation': 'Ventilación centralizada',
-            'SmokeAlarm': 'Detector de humo',
-            'Sauna': 'Sauna',
-            'Pool': 'Piscina',
-        }
-
-        readable_type = type_mapping.get(control_type, control_type)
-
-        classification = {
-            'uuid': uuid,
-            'name': name,
-            'type': control_type,
-            'type_readable': readable_type,
-            'room': self.get_room_name(room_uuid),
-            'category': self.get_category_name(cat_uuid),
-            'states': control.get('states', {}),
-            'details': control.get('details', {})
-        }
 
-        return classification
+        return ClassifiedControl.from_loxone(
+            uuid,
+            control,
+            type_readable=_TYPE_MAPPING.get(control_type, control_type),
+            room=self.get_room_name(control.get('room', '')),
+            category=self.get_category_name(control.get('cat', ''))
+        )
 
     def analyze_all(self) -> Dict[str, Any]:
         """Analiza todos los controles"""
@@ -232,25 +412,69 @@ class LoxoneAnalyzer:
                 'total_categories': len(self.categories),
             },
             'rooms': {},
-            'controls_by_type': defaultdict(list),
-            'controls_by_room': defaultdict(list),
+            'controls_by_type': {},
+            'controls_by_room': {},
             'all_controls': []
         }
 
-        # Clasificar cada control
+        # Grupos indexados por entero: cada tipo/habitación se resuelve una sola
+        # vez y los controles se añaden a listas planas
+        type_ids: Dict[str, Tuple[str, int]] = {}
+        type_group_ids: Dict[str, int] = {}
+        type_groups: List[List[ClassifiedControl]] = []
+        room_ids: Dict[str, Tuple[Optional[str], int]] = {}
+        room_group_ids: Dict[str, int] = {}
+        room_groups: List[List[ClassifiedControl]] = []
+        category_names: Dict[str, Optional[str]] = {}
+
+        all_controls = analysis['all_controls']
+
+        # Clasificar cada control (en línea, equivalente a classify_control)
         for uuid, control in self.controls.items():
-            classified = self.classify_control(uuid, control)
+            control_type = control.get('type', 'unknown')
+            room_uuid = control.get('room', '')
+            cat_uuid = control.get('cat', '')
+
+            type_entry = type_ids.get(control_type)
+            if type_entry is None:
+                readable_type = _TYPE_MAPPING.get(control_type, control_type)
+                type_id = type_group_ids.get(readable_type)
+                if type_id is None:
+                    type_id = type_group_ids[readable_type] = len(type_groups)
+                    type_groups.append([])
+                type_entry = type_ids[control_type] = (readable_type, type_id)
+
+            room_entry = room_ids.get(room_uuid)
+            if room_entry is None:
+                room_name = self.get_room_name(room_uuid)
+                room_key = room_name or NO_ROOM
+                room_id = room_group_ids.get(room_key)
+                if room_id is None:
+                    room_id = room_group_ids[room_key] = len(room_groups)
+                    room_groups.append([])
+                room_entry = room_ids[room_uuid] = (room_name, room_id)
+
+            if cat_uuid in category_names:
+                category = category_names[cat_uuid]
+            else:
+                category = category_names[cat_uuid] = self.get_category_name(cat_uuid)
 
-            # Añadir a lista completa
-            analysis['all_controls'].append(classified)
+            classified = ClassifiedControl.from_loxone(
+                uuid,
+                control,
+                type_readable=type_entry[0],
+                room=room_entry[0],
+                category=category
+            )
 
-            # Agrupar por tipo
-            control_type = classified['type_readable']
-            analysis['controls_by_type'][control_type].append(classified)
+            all_controls.append(classified)
+            type_groups[type_entry[1]].append(classified)
+            room_groups[room_entry[1]].append(classified)
 
-            # Agrupar por habitación
-            room = classified['room'] or 'Sin habitación'
-            analysis['controls_by_room'][room].append(classified)
+        # Agrupar por tipo y por habitación, ordenados una sola vez por nombre
+        # (los dict conservan el orden de inserción)
+        analysis['controls_by_type'] = dict(sorted(zip(type_group_ids, type_groups), key=itemgetter(0)))
+        analysis['controls_by_room'] = dict(sorted(zip(room_group_ids, room_groups), key=itemgetter(0)))
 
         # Guardar información de habitaciones
         for room_uuid, room_data in self.rooms.items():
@@ -285,22 +509,22 @@ class LoxoneAnalyzer:
 
         # Controles por tipo
         print(f"\n🎛️  CONTROLES POR TIPO:")
-        for control_type, controls in sorted(self.analysis['controls_by_type'].items()):
+        for control_type, controls in self.analysis['controls_by_type'].items():
             print(f"\n  📌 {control_type} ({len(controls)}):")
             for control in controls[:10]:
-                room = f" [{control['room']}]" if control['room'] else ""
-                print(f"    • {control['name']}{room}")
+                room = f" [{control.room}]" if control.room else ""
+                print(f"    • {control.name}{room}")
 
             if len(controls) > 10:
                 print(f"    ... y {len(controls)-10} más")
 
         # Controles por habitación
         print(f"\n🏠 CONTROLES POR HABITACIÓN:")
-        for room, controls in sorted(self.analysis['controls_by_room'].items()):
+        for room, controls in self.analysis['controls_by_room'].items():
             if controls:
                 print(f"\n  📍 {room} ({len(controls)} controles):")
                 for control in controls[:8]:
-                    print(f"    • {control['name']} ({control['type_readable']})")
+                    print(f"    • {control.name} ({control.type_readable})")
 
                 if len(controls) > 8:
                     print(f"    ... y {len(controls)-8} más")
@@ -314,11 +538,17 @@ class LoxoneAnalyzer:
             return False
 
         try:
-            # Convertir defaultdict a dict para JSON
-            analysis_copy = json.loads(json.dumps(self.analysis, default=list))
-
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(analysis_copy, f, ensure_ascii=False, indent=2)
+            if orjson is not None:
+                # orjson escribe bytes UTF-8 directamente, sin copia intermedia
+                # (los dataclass se serializan de forma nativa)
+                with open(filepath, 'wb') as f:
+                    f.write(orjson.dumps(
+                        self.analysis,
+                        option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+                    ))
+            else:
+                with open(filepath, 'w', encoding='utf-8') as f:
+                    json.dump(self.analysis, f, ensure_ascii=False, indent=2, default=asdict)
 
             print(f"✓ Análisis guardado en: {filepath}")
             return True
@@ -329,7 +559,7 @@ class LoxoneAnalyzer:
 
     # ⭐ FUNCIONALIDADES DE MONITOR DE GRUPO
 
-    def list_all_controls_numbered(self) -> List[Dict[str, Any]]:
+    def list_all_controls_numbered(self) -> List[ClassifiedControl]:
         """Lista todos los controles con numeración para selección"""
         if not self.analysis or not self.analysis.get('all_controls'):
             print("❌ No hay controles disponibles. Ejecuta analyze_all() primero.")
@@ -342,22 +572,25 @@ class LoxoneAnalyzer:
         print("="*90)
 
         for idx, control in enumerate(controls_list, 1):
-            room = f"[{control['room']}]" if control['room'] else "[Sin habitación]"
-            type_str = control['type_readable']
-            name = control['name']
+            room = f"[{control.room or NO_ROOM}]"
+            type_str = control.type_readable
+            name = control.name
+            no_states = "" if control.pollable else "  (sin estados)"
 
-            print(f"{idx:4d}. {room:20s} {type_str:25s} {name}")
+            print(f"{idx:4d}. {room:20s} {type_str:25s} {name}{no_states}")
 
         print("="*90)
         print(f"Total: {len(controls_list)} controles\n")
+        if any(not c.pollable for c in controls_list):
+            print("ℹ️  Los controles marcados '(sin estados)' no se pueden monitorizar\n")
 
         # Añadir índice a cada control
         for idx, control in enumerate(controls_list, 1):
-            control['index'] = idx
+            control.index = idx
 
         return controls_list
 
-    def select_controls_interactive(self, controls_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def select_controls_interactive(self, controls_list: List[ClassifiedControl]) -> List[ClassifiedControl]:
         """Permite añadir controles una por una de forma interactiva"""
         print("\n📌 SELECCIÓN INTERACTIVA DE CONTROLES")
         print("="*80)
@@ -415,7 +648,9 @@ class LoxoneAnalyzer:
                         selected_controls.append(control)
                         selected_indices.add(idx)
                         added += 1
-                        print(f"  ✓ Añadido: {control['name']} ({control['type_readable']})")
+                        print(f"  ✓ Añadido: {control.name} ({control.type_readable})")
+                        if not control.pollable:
+                            print(f"    ⚠️  Sin estados: se ignorará durante el monitoreo")
 
                 if added == 0:
                     print("  ⚠️  Control(es) ya seleccionado(s) o número inválido")
@@ -427,39 +662,179 @@ class LoxoneAnalyzer:
         if selected_controls:
             print(f"\n📊 RESUMEN DE SELECCIÓN ({len(selected_controls)} controles):")
             for i, control in enumerate(selected_controls[:10], 1):
-                room = f" [{control['room']}]" if control['room'] else ""
-                print(f"  {i}. {control['name']}{room}")
+                room = f" [{control.room}]" if control.room else ""
+                print(f"  {i}. {control.name}{room}")
             if len(selected_controls) > 10:
                 print(f"  ... y {len(selected_controls) - 10} más")
 
         return selected_controls
 
+    @staticmethod
+    def get_state_url(uuid: str) -> str:
+        """URL del endpoint de estado de un control"""
+        return f"{LOXONE_BASE_URL}/jdev/sps/io/{uuid}/state"
+
     def get_control_state(self, uuid: str) -> Optional[str]:
         """Obtiene el estado actual de un control mediante la API de Loxone"""
+        return self._get_state(self.get_state_url(uuid))
+
+    def _get_state(self, url: str) -> Optional[str]:
+        """Obtiene el estado de un control a partir de su URL de estado ya construida"""
         try:
-            # Endpoint para obtener estado
-            url = f"{LOXONE_BASE_URL}/jdev/sps/io/{uuid}/state"
-            response = requests.get(url, auth=self.auth, timeout=5)
+            response = self.session.get(url, timeout=5)
             response.raise_for_status()
 
-            data = response.json()
+            return self.parse_control_state(response.content)
 
-            # Loxone devuelve el estado en LL.value
-            if 'LL' in data and 'value' in data['LL']:
-                return str(data['LL']['value'])
+        except:
+            return None
+
+    @staticmethod
+    def parse_control_state(content: bytes) -> Optional[str]:
+        """Extrae el estado de la respuesta de /jdev/sps/io/{uuid}/state"""
+        # Vía rápida: la respuesta es diminuta ({"LL": {..., "value": "..."}}),
+        # una regex sobre los bytes evita construir el diccionario completo
+        match = _STATE_VALUE_RE.search(content)
+        if match is not None:
+            if match.group(1) is not None:
+                return canonical_state(match.group(1).decode('utf-8'))
+            # Números: mismo texto que str() del valor parseado por JSON ("22.50" -> "22.5")
+            number = match.group(2)
+            return canonical_state(str(float(number)) if b'.' in number else str(int(number)))
+
+        # Cadenas con escapes u otros casos raros: parseo JSON completo
+        data = orjson.loads(content) if orjson is not None else json.loads(content)
+
+        # Loxone devuelve el estado en LL.value
+        if 'LL' in data and 'value' in data['LL']:
+            return canonical_state(str(data['LL']['value']))
+
+        return None
+
+    @staticmethod
+    def get_primary_state_uuid(control: ClassifiedControl) -> Optional[str]:
+        """Devuelve el UUID del estado que representa el valor principal de un control"""
+        # Solo estados numéricos conocidos: el push únicamente procesa eventos de valor,
+        # así que un estado de texto (activeMoods, text...) no recibiría nunca cambios
+        states = control.states or {}
+        for key in _PRIMARY_STATE_KEYS:
+            if isinstance(states.get(key), str):
+                return states[key]
+        return None
+
+    def _ws_read(self, ws) -> Tuple[int, Any]:
+        """Lee un mensaje del WebSocket (cabecera binaria + contenido)"""
+        # Solo la espera de la primera cabecera puede agotar el timeout sin consecuencias
+        header = ws.recv()
+
+        try:
+            while True:
+                _, identifier, info, _ = _WS_HEADER.unpack(header)
+                # Cabecera estimada: le sigue otra cabecera con la longitud exacta
+                if not info & 0x01:
+                    break
+                header = ws.recv()
+
+            if identifier in (_WS_MSG_OUT_OF_SERVICE, _WS_MSG_KEEPALIVE):
+                return identifier, b''
+
+            return identifier, ws.recv()
+
+        except websocket.WebSocketTimeoutException as e:
+            # Un timeout tras la cabecera desincroniza el flujo: el siguiente
+            # recv() tomaría el contenido por cabecera
+            raise ConnectionError("timeout tras la cabecera del mensaje") from e
 
+    def _ws_command(self, ws, command: str) -> Dict[str, Any]:
+        """Envía un comando de texto por WebSocket y devuelve el contenido de LL"""
+        ws.send(command)
+        while True:
+            identifier, payload = self._ws_read(ws)
+            if identifier == _WS_MSG_TEXT:
+                return json.loads(payload).get('LL', {})
+
+    def _ws_key_exchange(self, ws) -> Tuple[bytes, bytes]:
+        """Acuerda con el Miniserver una clave AES de sesión cifrada con su clave pública RSA"""
+        # La clave pública llega como PEM etiquetado 'CERTIFICATE', a veces sin saltos de línea
+        pem = self._ws_command(ws, "jdev/sys/getPublicKey")['value']
+        public_key = load_der_public_key(base64.b64decode(re.sub(r'-----[^-]+-----|\s', '', pem)))
+
+        aes_key = os.urandom(32)
+        aes_iv = os.urandom(16)
+        session_key = base64.b64encode(
+            public_key.encrypt(f"{aes_key.hex()}:{aes_iv.hex()}".encode('ascii'), PKCS1v15())
+        ).decode('ascii')
+
+        result = self._ws_command(ws, f"jdev/sys/keyexchange/{session_key}")
+        if str(result.get('Code', result.get('code'))) != '200':
+            raise ConnectionError("intercambio de claves rechazado")
+
+        return aes_key, aes_iv
+
+    def connect_websocket(self):
+        """Abre un WebSocket autenticado y activa el envío de cambios de estado"""
+        if websocket is None:
             return None
 
-        except:
+        if Cipher is None:
+            print("   ℹ️  WebSocket requiere el paquete 'cryptography', usando consulta HTTP")
+            return None
+
+        ws = None
+        try:
+            ws = websocket.create_connection(LOXONE_WS_URL, timeout=10, subprotocols=["remotecontrol"])
+
+            # El comando de token solo se acepta cifrado: primero se acuerda la clave AES
+            aes_key, aes_iv = self._ws_key_exchange(ws)
+
+            # Autenticación por token: hash HMAC de usuario + hash de contraseña con sal
+            key_info = self._ws_command(ws, f"jdev/sys/getkey2/{LOXONE_USER}")['value']
+            hash_alg = hashlib.sha256 if key_info.get('hashAlg', 'SHA1').upper() == 'SHA256' else hashlib.sha1
+            pw_hash = hash_alg(f"{LOXONE_PASSWORD}:{key_info['salt']}".encode('utf-8')).hexdigest().upper()
+            auth_hash = hmac.new(
+                bytes.fromhex(key_info['key']),
+                f"{LOXONE_USER}:{pw_hash}".encode('utf-8'),
+                hash_alg
+            ).hexdigest()
+
+            token = self._ws_command(ws, encrypt_ws_command(
+                f"jdev/sys/getjwt/{auth_hash}/{LOXONE_USER}/2/{uuid4()}/loxone_knx_datalogger",
+                aes_key,
+                aes_iv
+            ))
+            if str(token.get('Code', token.get('code'))) != '200':
+                print(f"   ℹ️  WebSocket: autenticación rechazada, usando consulta HTTP")
+                ws.close()
+                return None
+
+            self._ws_command(ws, "jdev/sps/enablebinstatusupdate")
+            ws.settimeout(1)
+            return ws
+
+        except Exception as e:
+            print(f"   ℹ️  WebSocket no disponible ({e}), usando consulta HTTP")
+            if ws is not None:
+                ws.close()
             return None
 
-    def start_group_monitoring(self, selected_controls: List[Dict[str, Any]], csv_filename: str = None):
+    def start_group_monitoring(self, selected_controls: List[ClassifiedControl], csv_filename: str = None):
         """Inicia monitoreo continuo guardando SOLO cuando cambian los valores"""
 
         if not selected_controls:
             print("❌ No hay controles seleccionados para monitorizar")
             return
 
+        # Descartar controles sin estados: consultarlos solo gastaría una petición por tick
+        skipped = len(selected_controls)
+        selected_controls = [c for c in selected_controls if c.pollable]
+        skipped -= len(selected_controls)
+        if skipped:
+            print(f"ℹ️  Ignorados {skipped} controles sin estados")
+
+        if not selected_controls:
+            print("❌ Ninguno de los controles seleccionados tiene estados que monitorizar")
+            return
+
         # Generar nombre de archivo si no se proporciona
         if csv_filename is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -475,108 +850,288 @@ class LoxoneAnalyzer:
         print("\n⚠️  Presiona ENTER para detener el monitoreo")
         print("="*80)
 
-        monitoring = {"active": True}
+        stop_event = threading.Event()
 
-        # Diccionario para guardar el último estado conocido
-        last_states = {}
+        # Los mensajes del monitor se imprimen desde un thread aparte: el bucle de
+        # consulta solo encola y nunca se bloquea escribiendo en la consola
+        log_queue = queue.SimpleQueue()
 
-        try:
-            # Columnas del CSV
-            fieldnames = ['timestamp', 'uuid', 'name', 'type', 'room', 'state']
+        def log_consumer():
+            while True:
+                item = log_queue.get()
+                if item is None:
+                    break
+                if isinstance(item, tuple):
+                    timestamp, name, old_state, new_state = item
+                    print(f"🔄 [{timestamp}] {name}: {old_state} → {new_state}")
+                else:
+                    print(item)
+
+        # Último estado conocido de cada control, en el mismo orden que selected_controls
+        last_states: List[Optional[str]] = [None] * len(selected_controls)
 
-            # Abrir archivo CSV
+        try:
+            # Parte fija de cada fila ya escapada y codificada, calculada una sola vez:
+            # (uuid, nombre, b'uuid,nombre,tipo,habitación,')
+            static_rows = [
+                (
+                    c.uuid,
+                    c.name,
+                    ','.join(
+                        csv_field(field)
+                        for field in (c.uuid, c.name, c.type_readable, c.room or NO_ROOM)
+                    ).encode('utf-8') + b','
+                )
+                for c in selected_controls
+            ]
+
+            # Abrir archivo CSV en binario con buffer amplio: se vuelca como mucho una vez por tick
             file_exists = os.path.exists(csv_filename)
-            csvfile = open(csv_filename, 'a', newline='', encoding='utf-8')
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, extrasaction='ignore')
+            csvfile = open(csv_filename, 'ab', buffering=1 << 16)
 
             if not file_exists:
-                writer.writeheader()
+                csvfile.write(_CSV_HEADER)
+
+            # Pool de threads para consultar todos los controles en paralelo
+            # (la consulta es I/O: cada tick cuesta ~1 RTT en lugar de N)
+            executor = ThreadPoolExecutor(max_workers=min(32, len(selected_controls)))
+
+            # URLs de estado construidas una sola vez, en el orden de selected_controls
+            state_urls = [self.get_state_url(c.uuid) for c in selected_controls]
+
+            def poll_states() -> List[Optional[str]]:
+                return list(executor.map(self._get_state, state_urls))
 
             # Inicializar estados previos y escribir estado inicial
             print("\n📝 Guardando estado inicial...")
-            for control in selected_controls:
-                uuid = control['uuid']
-                current_state = self.get_control_state(uuid)
-
+            initial_rows = []
+            ts_prefix = datetime.now().isoformat(timespec='seconds').encode('ascii') + b','
+            for index, current_state in enumerate(poll_states()):
                 if current_state is not None:
-                    last_states[uuid] = current_state
+                    last_states[index] = current_state
 
                     # Guardar estado inicial
-                    row = {
-                        'timestamp': datetime.now().isoformat(),
-                        'uuid': uuid,
-                        'name': control['name'],
-                        'type': control['type_readable'],
-                        'room': control['room'] or 'Sin habitación',
-                        'state': current_state
-                    }
-
-                    writer.writerow(row)
+                    prefix = static_rows[index][2]
+                    initial_rows.append(ts_prefix + prefix + csv_field(current_state).encode('utf-8') + b'\r\n')
 
+            csvfile.write(b''.join(initial_rows))
             csvfile.flush()
             print(f"✓ Estado inicial guardado ({len(selected_controls)} registros)")
 
-            # Thread para monitoreo continuo
-            def monitor_loop():
+            # Preferir cambios por push (WebSocket); la consulta HTTP queda como respaldo
+            ws = self.connect_websocket()
+            state_index = {}
+            # Controles sin estado numérico suscribible: se siguen consultando por HTTP
+            uncovered: List[int] = []
+            if ws is not None:
+                for index, control in enumerate(selected_controls):
+                    state_uuid = self.get_primary_state_uuid(control)
+                    try:
+                        state_index[pack_loxone_uuid(state_uuid)] = index
+                    except (AttributeError, ValueError):
+                        uncovered.append(index)
+                if state_index:
+                    print(f"📡 Modo WebSocket: {len(state_index)} estados suscritos")
+                    if uncovered:
+                        print(f"   ℹ️  {len(uncovered)} controles sin estado numérico, se consultan por HTTP:")
+                        for index in uncovered:
+                            print(f"      • {selected_controls[index].name}")
+                else:
+                    ws.close()
+            uncovered_urls = [state_urls[index] for index in uncovered]
+
+            def diff_states(states: List[Optional[str]]) -> List[Tuple[int, str]]:
+                """Compara un tick completo con el anterior y devuelve (índice, nuevo estado) de los cambios"""
+                # map(ne) + compress recorren ambas listas en C: el bucle Python
+                # solo visita los controles que realmente cambiaron
+                changed = compress(range(len(states)), map(ne, states, last_states))
+                return [(index, states[index]) for index in changed if states[index] is not None]
+
+            def write_changes(changes: List[Tuple[int, str]]) -> int:
+                """Escribe en el CSV los cambios del tick y devuelve cuántos"""
+                if not changes:
+                    return 0
+
+                # Marca de tiempo compartida por todas las filas del tick
+                timestamp = datetime.now().isoformat(timespec='seconds')
+                ts_prefix = timestamp.encode('ascii') + b','
+
+                for index, new_state in changes:
+                    old_state = last_states[index]
+                    last_states[index] = new_state
+                    _, name, prefix = static_rows[index]
+
+                    csvfile.write(ts_prefix + prefix + csv_field(new_state).encode('utf-8') + b'\r\n')
+
+                    # Mostrar cambio
+                    log_queue.put((timestamp, name, old_state, new_state))
+
+                # Un único volcado a disco por tick
+                csvfile.flush()
+                return len(changes)
+
+            def value_events(payload: bytes) -> List[Tuple[int, str]]:
+                """Extrae los cambios de una tabla de eventos de valor del WebSocket"""
+                # Último valor de cada estado dentro de la tabla: un mismo UUID puede
+                # aparecer varias veces y solo debe generar una fila por tabla
+                table_states: Dict[int, str] = {}
+                for offset in range(0, len(payload), _WS_VALUE_EVENT_SIZE):
+                    # Solo interesan los UUIDs de los controles seleccionados
+                    index = state_index.get(payload[offset:offset + 16])
+                    if index is not None:
+                        table_states[index] = format_state_value(_WS_DOUBLE.unpack_from(payload, offset + 16)[0])
+                return [
+                    (index, new_state) for index, new_state in table_states.items()
+                    if new_state != last_states[index]
+                ]
+
+            def poll_uncovered() -> List[Tuple[int, str]]:
+                """Consulta por HTTP los controles que el push no cubre y devuelve sus cambios"""
+                states = executor.map(self._get_state, uncovered_urls)
+                return [
+                    (index, state) for index, state in zip(uncovered, states)
+                    if state is not None and state != last_states[index]
+                ]
+
+            def push_loop():
+                changes_count = 0
+                events_count = 0
+                checks_count = 0
+                last_keepalive = next_poll = time.monotonic()
+
+                while not stop_event.is_set():
+                    # El Miniserver cierra la conexión si no recibe nada en 5 minutos
+                    if time.monotonic() - last_keepalive > _WS_KEEPALIVE_INTERVAL:
+                        ws.send("keepalive")
+                        last_keepalive = time.monotonic()
+
+                    # Los controles no cubiertos por el push se consultan cada segundo
+                    if uncovered and time.monotonic() >= next_poll:
+                        next_poll = time.monotonic() + 1
+                        checks_count += 1
+                        changes_count += write_changes(poll_uncovered())
+
+                    try:
+                        identifier, payload = self._ws_read(ws)
+                    except websocket.WebSocketTimeoutException:
+                        continue
+                    except Exception as e:
+                        log_queue.put(f"⚠️  Conexión WebSocket perdida ({e}), pasando a consulta HTTP")
+                        break
+
+                    if identifier != _WS_MSG_VALUE_STATES:
+                        continue
+
+                    events_count += 1
+                    changes_count += write_changes(value_events(payload))
+
+                    if events_count % 100 == 0:
+                        log_queue.put(f"📊 Eventos: {events_count} | Cambios detectados: {changes_count}")
+
+                ws.close()
+                return events_count, checks_count, changes_count
+
+            def poll_loop():
+                """Consulta HTTP con threads (modo clásico)"""
                 changes_count = 0
                 checks_count = 0
 
-                while monitoring["active"]:
+                while not stop_event.is_set():
                     checks_count += 1
-                    timestamp = datetime.now().isoformat()
 
-                    for control in selected_controls:
-                        uuid = control['uuid']
+                    # Obtener estado actual de todos los controles en paralelo;
+                    # la escritura en CSV se hace solo desde este thread
+                    changes_count += write_changes(diff_states(poll_states()))
 
-                        # Obtener estado actual
-                        new_state = self.get_control_state(uuid)
+                    # Mostrar estadísticas cada 100 comprobaciones
+                    if checks_count % 100 == 0:
+                        log_queue.put(f"📊 Comprobaciones: {checks_count} | Cambios detectados: {changes_count}")
 
-                        if new_state is not None:
-                            old_state = last_states.get(uuid)
+                    # Esperar antes de la siguiente comprobación (1 segundo)
+                    stop_event.wait(1)
 
-                            # Solo guardar si cambió el estado
-                            if new_state != old_state:
-                                changes_count += 1
-                                last_states[uuid] = new_state
+                return checks_count, changes_count
 
-                                row = {
-                                    'timestamp': timestamp,
-                                    'uuid': uuid,
-                                    'name': control['name'],
-                                    'type': control['type_readable'],
-                                    'room': control['room'] or 'Sin habitación',
-                                    'state': new_state
-                                }
+            async def async_poll_loop():
+                """Consulta HTTP asíncrona: todas las peticiones del tick en vuelo a la vez"""
+                changes_count = 0
+                checks_count = 0
 
-                                writer.writerow(row)
-                                csvfile.flush()
+                async def fetch_state(client, url: str) -> Optional[str]:
+                    try:
+                        response = await client.get(url)
+                        response.raise_for_status()
+                        return self.parse_control_state(response.content)
+                    except Exception:
+                        return None
 
-                                # Mostrar cambio
-                                print(f"🔄 [{timestamp}] {control['name']}: {old_state} → {new_state}")
+                async with httpx.AsyncClient(
+                    auth=(LOXONE_USER, LOXONE_PASSWORD),
+                    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+                    timeout=5
+                ) as client:
+                    while not stop_event.is_set():
+                        checks_count += 1
 
-                    # Mostrar estadísticas cada 100 comprobaciones
-                    if checks_count % 100 == 0:
-                        print(f"📊 Comprobaciones: {checks_count} | Cambios detectados: {changes_count}")
+                        states = await asyncio.gather(*(fetch_state(client, url) for url in state_urls))
+                        # Diff y escritura desde una única corrutina: sin necesidad de locks
+                        changes_count += write_changes(diff_states(states))
 
-                    # Esperar antes de la siguiente comprobación (1 segundo)
-                    time.sleep(1)
+                        if checks_count % 100 == 0:
+                            log_queue.put(f"📊 Comprobaciones: {checks_count} | Cambios detectados: {changes_count}")
 
-                csvfile.close()
-                print(f"\n✓ Monitoreo finalizado")
-                print(f"  📈 Total comprobaciones: {checks_count}")
-                print(f"  🔄 Total cambios guardados: {changes_count}")
-                print(f"  📄 Archivo: {csv_filename}")
+                        await asyncio.sleep(1)
 
-            # Iniciar thread de monitoreo
+                return checks_count, changes_count
+
+            # Thread para monitoreo continuo
+            def monitor_loop():
+                # Mensajes WebSocket recibidos y ticks de consulta HTTP se cuentan por separado
+                events_count = checks_count = changes_count = 0
+
+                try:
+                    if state_index:
+                        events_count, checks_count, changes_count = push_loop()
+
+                    if not stop_event.is_set():
+                        if httpx is not None and not LOXONE_LEGACY_MONITOR:
+                            poll_checks, poll_changes = asyncio.run(async_poll_loop())
+                        else:
+                            poll_checks, poll_changes = poll_loop()
+                        checks_count += poll_checks
+                        changes_count += poll_changes
+
+                except Exception as e:
+                    log_queue.put(f"❌ Error durante el monitoreo: {e}")
+
+                finally:
+                    executor.shutdown(wait=False)
+                    csvfile.close()
+                    log_queue.put(f"\n✓ Monitoreo finalizado")
+                    if state_index:
+                        log_queue.put(f"  📡 Total eventos WebSocket: {events_count}")
+                    log_queue.put(f"  📈 Total comprobaciones HTTP: {checks_count}")
+                    log_queue.put(f"  🔄 Total cambios guardados: {changes_count}")
+                    log_queue.put(f"  📄 Archivo: {csv_filename}")
+                    # Fin de mensajes: el thread de consola termina tras vaciar la cola
+                    log_queue.put(None)
+
+            # Iniciar thread de consola y thread de monitoreo
+            log_thread = threading.Thread(target=log_consumer, daemon=True)
+            log_thread.start()
             monitor_thread = threading.Thread(target=monitor_loop, daemon=True)
             monitor_thread.start()
 
             # Esperar a que el usuario presione Enter
             input()
 
-            # Detener monitoreo
-            monitoring["active"] = False
-            monitor_thread.join(timeout=5)
+            # Detener monitoreo: esperar sin límite a que termine el tick en curso
+            # (timeout HTTP + reintentos) y a que se impriman todos los mensajes,
+            # para no volver al menú con el CSV aún abierto
+            print("⏳ Deteniendo monitoreo...")
+            stop_event.set()
+            monitor_thread.join()
+            log_thread.join()
 
             print("\n" + "="*80)
             print("🛑 Monitoreo detenido por el usuario")
@@ -584,7 +1139,7 @@ class LoxoneAnalyzer:
 
         except Exception as e:
             print(f"❌ Error durante el monitoreo: {e}")
-            monitoring["active"] = False
+            stop_event.set()
 
 
 def main():